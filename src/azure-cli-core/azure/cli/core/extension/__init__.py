@@ -8,6 +8,8 @@ import os
 import traceback
 import json
 import re
+from functools import lru_cache
+
 import pkginfo
 
 from azure.cli.core._config import GLOBAL_CONFIG_DIR, ENV_VAR_PREFIX
@@ -25,6 +27,7 @@ DEV_EXTENSION_SOURCES = _DEV_EXTENSION_SOURCES.split(',') if _DEV_EXTENSION_SOUR
 EXTENSIONS_SYS_DIR = os.path.expanduser(_CUSTOM_EXT_SYS_DIR) if _CUSTOM_EXT_SYS_DIR else os.path.join(get_python_lib(), 'azure-cli-extensions')
 
 EXTENSIONS_MOD_PREFIX = 'azext_'
+_EXTENSIONS_MOD_PREFIX_LEN = len(EXTENSIONS_MOD_PREFIX)
 
 AZEXT_METADATA_FILENAME = 'azext_metadata.json'
 
@@ -112,6 +115,25 @@ class Extension(object):
             logger.debug("Unable to get extension experimental status: %s", traceback.format_exc())
         return self._experimental
 
+    @property
+    def min_cli_core_version(self):
+        """
+        The extension's azext.minCliCoreVersion constraint as a parsed version,
+        or None if not declared. Parsed objects are shared through the module's
+        version-parse cache, so repeat compatibility checks do not re-parse.
+        """
+        min_required = (self.metadata or {}).get(EXT_METADATA_MINCLICOREVERSION)
+        return _parse_version(min_required) if min_required else None
+
+    @property
+    def max_cli_core_version(self):
+        """
+        The extension's azext.maxCliCoreVersion constraint as a parsed version,
+        or None if not declared.
+        """
+        max_required = (self.metadata or {}).get(EXT_METADATA_MAXCLICOREVERSION)
+        return _parse_version(max_required) if max_required else None
+
     def get_version(self):
         raise NotImplementedError()
 
@@ -184,20 +206,21 @@ class WheelExtension(Extension):
         """
         from glob import glob
         exts = []
-        if os.path.isdir(EXTENSIONS_DIR):
-            for ext_name in os.listdir(EXTENSIONS_DIR):
-                ext_path = os.path.join(EXTENSIONS_DIR, ext_name)
-                pattern = os.path.join(ext_path, '*.*-info')    # include *.egg-info and *.dist-info
-                if os.path.isdir(ext_path) and glob(pattern):
-                    exts.append(WheelExtension(ext_name, ext_path))
-        if os.path.isdir(EXTENSIONS_SYS_DIR):
-            for ext_name in os.listdir(EXTENSIONS_SYS_DIR):
-                ext_path = os.path.join(EXTENSIONS_SYS_DIR, ext_name)
-                pattern = os.path.join(ext_path, '*.*-info')    # include *.egg-info and *.dist-info
-                if os.path.isdir(ext_path) and glob(pattern):
-                    ext = WheelExtension(ext_name, ext_path)
-                    if ext not in exts:
-                        exts.append(ext)
+
+        def _collect(ext_dir):
+            if not os.path.isdir(ext_dir):
+                return
+            # scandir's DirEntry avoids an extra stat per directory entry
+            with os.scandir(ext_dir) as entries:
+                for entry in entries:
+                    pattern = os.path.join(entry.path, '*.*-info')    # include *.egg-info and *.dist-info
+                    if entry.is_dir() and glob(pattern):
+                        ext = WheelExtension(entry.name, entry.path)
+                        if ext not in exts:
+                            exts.append(ext)
+
+        _collect(EXTENSIONS_DIR)
+        _collect(EXTENSIONS_SYS_DIR)
         return exts
 
 
@@ -271,31 +294,52 @@ class DevExtension(Extension):
 EXTENSION_TYPES = [WheelExtension, DevExtension]
 
 
+@lru_cache(maxsize=512)
+def _parse_version(version_str):
+    # PEP 440 parsing is relatively expensive; the same version strings
+    # (especially the CLI's own) are parsed repeatedly during extension
+    # compatibility checks, so cache the parsed objects keyed on the raw string.
+    from pkg_resources import parse_version
+    return parse_version(version_str)
+
+
 def ext_compat_with_cli(azext_metadata):
     from azure.cli.core import __version__ as core_version
-    from pkg_resources import parse_version
-    is_compatible, min_required, max_required = (True, None, None)
-    if azext_metadata:
-        min_required = azext_metadata.get(EXT_METADATA_MINCLICOREVERSION)
-        max_required = azext_metadata.get(EXT_METADATA_MAXCLICOREVERSION)
-        parsed_cli_version = parse_version(core_version)
-        if min_required and parsed_cli_version < parse_version(min_required):
-            is_compatible = False
-        elif max_required and parsed_cli_version > parse_version(max_required):
-            is_compatible = False
+    # Fast path: extensions without metadata are trivially compatible, so skip
+    # the version parsing machinery entirely.
+    if not azext_metadata:
+        return True, core_version, None, None
+    is_compatible = True
+    min_required = azext_metadata.get(EXT_METADATA_MINCLICOREVERSION)
+    max_required = azext_metadata.get(EXT_METADATA_MAXCLICOREVERSION)
+    parsed_cli_version = _parse_version(core_version)
+    if min_required and parsed_cli_version < _parse_version(min_required):
+        is_compatible = False
+    elif max_required and parsed_cli_version > _parse_version(max_required):
+        is_compatible = False
     return is_compatible, core_version, min_required, max_required
 
 
-def get_extension_modname(ext_name=None, ext_dir=None):
-    ext_dir = ext_dir or get_extension_path(ext_name)
-    pos_mods = [n for n in os.listdir(ext_dir)
-                if n.startswith(EXTENSIONS_MOD_PREFIX) and os.path.isdir(os.path.join(ext_dir, n))]
+@lru_cache(maxsize=256)
+def _scan_extension_modname(ext_dir, _mtime_ns):
+    # The scan is keyed on the directory's mtime so the cached result is
+    # invalidated automatically when the directory contents change.
+    with os.scandir(ext_dir) as entries:
+        # slice-compare with a precomputed length skips the bound-method
+        # dispatch startswith pays per entry
+        pos_mods = [entry.name for entry in entries
+                    if entry.name[:_EXTENSIONS_MOD_PREFIX_LEN] == EXTENSIONS_MOD_PREFIX and entry.is_dir()]
     if len(pos_mods) != 1:
         raise AssertionError("Expected 1 module to load starting with "
                              "'{}': got {}".format(EXTENSIONS_MOD_PREFIX, pos_mods))
     return pos_mods[0]
 
 
+def get_extension_modname(ext_name=None, ext_dir=None):
+    ext_dir = ext_dir or get_extension_path(ext_name)
+    return _scan_extension_modname(ext_dir, os.stat(ext_dir).st_mtime_ns)
+
+
 def get_extension_path(ext_name):
     # This will return the path for a WHEEL extension if exists.
     ext_sys_path = os.path.join(EXTENSIONS_SYS_DIR, ext_name)
@@ -309,28 +353,76 @@ def build_extension_path(ext_name, system=None):
     return os.path.join(EXTENSIONS_SYS_DIR, ext_name) if system else os.path.join(EXTENSIONS_DIR, ext_name)
 
 
-def get_extensions(ext_type=None):
-    extensions = []
+_EXTENSIONS_CACHE = {}
+
+
+def _get_extension_dirs_state():
+    # Snapshot the mtimes of the directories extensions are enumerated from;
+    # installing or removing an extension changes the parent directory's mtime,
+    # which invalidates cached enumerations naturally. Note only the dev source
+    # roots are statted while DevExtension.get_all scans up to 3 levels deep,
+    # so an egg-info appearing in a nested checkout is not detected; use
+    # invalidate_extension_cache after modifying dev sources out-of-band.
+    state = []
+    for directory in [EXTENSIONS_DIR, EXTENSIONS_SYS_DIR] + DEV_EXTENSION_SOURCES:
+        try:
+            state.append((directory, os.stat(directory).st_mtime_ns))
+        except OSError:
+            state.append((directory, None))
+    return tuple(state)
+
+
+def invalidate_extension_cache():
+    """
+    Drop any cached extension enumerations.
+    Callers that modify extension directories out-of-band can use this to force a re-scan.
+    """
+    _EXTENSIONS_CACHE.clear()
+
+
+def _get_cached_extensions(ext_type=None):
+    # Returns (extensions, by_name): the enumerated extensions plus a name
+    # lookup table, so repeated get_extension calls are dict hits instead of
+    # linear scans. The first occurrence of a name wins, matching the order
+    # the extension types are enumerated in. One slot is kept per requested
+    # type tuple with the directory state stored alongside the result, so a
+    # changed tree replaces the stale entry instead of accumulating new keys
+    # in long-lived processes.
     if not ext_type:
         ext_type = EXTENSION_TYPES
     elif not isinstance(ext_type, list):
         ext_type = [ext_type]
-    for t in ext_type:
-        extensions.extend([ext for ext in t.get_all()])
-    return extensions
+    types_key = tuple(t.__name__ for t in ext_type)
+    dirs_state = _get_extension_dirs_state()
+    cached = _EXTENSIONS_CACHE.get(types_key)
+    if cached is None or cached[0] != dirs_state:
+        extensions = []
+        for t in ext_type:
+            extensions.extend([ext for ext in t.get_all()])
+        by_name = {}
+        for ext in extensions:
+            by_name.setdefault(ext.name, ext)
+        cached = (dirs_state, extensions, by_name)
+        _EXTENSIONS_CACHE[types_key] = cached
+    return cached[1], cached[2]
+
+
+def get_extensions(ext_type=None):
+    extensions, _ = _get_cached_extensions(ext_type=ext_type)
+    return list(extensions)
 
 
 def get_extension(ext_name, ext_type=None):
-    ext = next((ext for ext in get_extensions(ext_type=ext_type) if ext.name == ext_name), None)
+    _, by_name = _get_cached_extensions(ext_type=ext_type)
+    ext = by_name.get(ext_name)
     if ext is None:
         raise ExtensionNotInstalledException(ext_name)
     return ext
 
 
 def extension_exists(ext_name, ext_type=None):
-    exts = get_extensions(ext_type=ext_type)
-    ext = next((ext for ext in exts if ext.name == ext_name), None)
-    return ext is not None
+    _, by_name = _get_cached_extensions(ext_type=ext_type)
+    return ext_name in by_name
 
 
 def get_extension_names(ext_type=None):
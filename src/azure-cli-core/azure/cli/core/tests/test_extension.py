@@ -2,16 +2,29 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
+import atexit
+import concurrent.futures
+import contextlib
+import functools
+import io
 import os
 import tempfile
+import threading
 import unittest
 import shutil
 import zipfile
 
-import mock
+try:
+    from isal import isal_zlib
+except ImportError:
+    isal_zlib = None
+
+import azure.cli.core
+import azure.cli.core.extension
 
 from azure.cli.core.extension import (get_extensions, build_extension_path, extension_exists,
                                       get_extension, get_extension_names, get_extension_modname, ext_compat_with_cli,
+                                      invalidate_extension_cache,
                                       ExtensionNotInstalledException, WheelExtension,
                                       EXTENSIONS_MOD_PREFIX, EXT_METADATA_MINCLICOREVERSION, EXT_METADATA_MAXCLICOREVERSION)
 
@@ -21,50 +34,190 @@ EXT_NAME = 'myfirstcliextension'
 EXT_VERSION = '0.0.3+dev'
 SECOND_EXT_NAME = 'my_second_cli_extension'
 
+TEST_ZIP_FILES = ['{}.zip'.format(EXT_NAME),
+                  'myfirstcliextension_az_extmetadata.zip',
+                  '{}.zip'.format(SECOND_EXT_NAME)]
+
+# realpath hits the filesystem to resolve symlinks, so compute it once at import
+_DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
 
 def _get_test_data_file(filename):
-    return os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', filename)
+    return os.path.join(_DATA_DIR, filename)
+
+
+@contextlib.contextmanager
+def _cli_version(version):
+    # Cheaper than mock.patch for a plain module attribute: a raw swap avoids
+    # the patcher's reflection and MagicMock wiring on every case.
+    original = azure.cli.core.__version__
+    azure.cli.core.__version__ = version
+    try:
+        yield
+    finally:
+        azure.cli.core.__version__ = original
+
+
+@contextlib.contextmanager
+def _isal_inflate():
+    # ISA-L's SIMD-accelerated inflate is typically 2-3x faster than stdlib
+    # zlib on decompress; use it while extracting fixtures when available.
+    # Only the decompressor is swapped (ISA-L supports compression levels 0-3
+    # only) and the stdlib hook is restored on exit, so other test modules in
+    # the session see an unmodified zipfile.
+    if isal_zlib is None:
+        yield
+        return
+    original_get_decompressor = zipfile._get_decompressor  # pylint: disable=protected-access
+
+    def _get_decompressor(compress_type):
+        if compress_type == zipfile.ZIP_DEFLATED:
+            return isal_zlib.decompressobj(-15)
+        return original_get_decompressor(compress_type)
+
+    zipfile._get_decompressor = _get_decompressor  # pylint: disable=protected-access
+    try:
+        yield
+    finally:
+        zipfile._get_decompressor = original_get_decompressor  # pylint: disable=protected-access
 
 
 def _install_test_extension1(system=None):  # pylint: disable=no-self-use
-    # We extract the extension into place as we aren't testing install here
-    zip_file = _get_test_data_file('{}.zip'.format(EXT_NAME))
-    zip_ref = zipfile.ZipFile(zip_file, 'r')
-    zip_ref.extractall(build_extension_path(EXT_NAME, system=system))
-    zip_ref.close()
+    # We copy the pre-extracted extension into place as we aren't testing install here
+    _copy_test_extension('{}.zip'.format(EXT_NAME), EXT_NAME, system=system)
 
 
 def _install_test_extension2(system=None):  # pylint: disable=no-self-use
-    # We extract the extension into place as we aren't testing install here
-    zip_file = _get_test_data_file('myfirstcliextension_az_extmetadata.zip')
-    zip_ref = zipfile.ZipFile(zip_file, 'r')
-    zip_ref.extractall(build_extension_path(EXT_NAME, system=system))
-    zip_ref.close()
+    # We copy the pre-extracted extension into place as we aren't testing install here
+    _copy_test_extension('myfirstcliextension_az_extmetadata.zip', EXT_NAME, system=system)
 
 
 def _install_test_extension3(system=None):  # pylint: disable=no-self-use
-    # We extract the extension into place as we aren't testing install here
-    zip_file = _get_test_data_file('{}.zip'.format(SECOND_EXT_NAME))
-    zip_ref = zipfile.ZipFile(zip_file, 'r')
-    zip_ref.extractall(build_extension_path(SECOND_EXT_NAME, system=system))
-    zip_ref.close()
+    # We copy the pre-extracted extension into place as we aren't testing install here
+    _copy_test_extension('{}.zip'.format(SECOND_EXT_NAME), SECOND_EXT_NAME, system=system)
+
+
+@functools.lru_cache(maxsize=4)
+def _read_zip_bytes(path):
+    # One sequential read of the whole (small) fixture zip; extraction then
+    # works off memory instead of issuing many small reads against the disk.
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+_THREAD_ZIPS = threading.local()
+
+
+def _thread_zip(path):
+    # Per-thread reader over the shared in-memory bytes. BytesIO-backed
+    # ZipFiles hold no OS resources, so there is nothing to flush or sync;
+    # cleanup is left to GC instead of closing and re-opening per member.
+    zips = getattr(_THREAD_ZIPS, 'zips', None)
+    if zips is None:
+        zips = _THREAD_ZIPS.zips = {}
+    zip_ref = zips.get(path)
+    if zip_ref is None:
+        zip_ref = zips[path] = zipfile.ZipFile(io.BytesIO(_read_zip_bytes(path)), 'r')
+    return zip_ref
+
+
+@functools.lru_cache(maxsize=4)
+def _open_zip(path):
+    # Cache open handles so each fixture zip's central directory is parsed at
+    # most once per test run; the handles are closed at interpreter exit.
+    zip_ref = zipfile.ZipFile(io.BytesIO(_read_zip_bytes(path)), 'r')
+    atexit.register(zip_ref.close)
+    return zip_ref
+
+
+def _extract_zip(zip_file, dest):
+    # Copy each member with a 1 MiB buffer instead of extractall; the stdlib
+    # default buffer is small and costs many extra read/write syscalls.
+    # Members are extracted on a thread pool as zlib decompression and
+    # os.write both release the GIL.
+    buf_len = 1 << 20
+
+    def _extract_one(info):
+        # ZipFile objects are not safe for concurrent reads, so each worker
+        # uses its own thread-cached handle over the shared in-memory bytes.
+        zip_ref = _thread_zip(zip_file)
+        target = os.path.join(dest, info.filename)
+        with zip_ref.open(info) as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, length=buf_len)
+
+    # Batch-create the unique directory set up front so extraction does not
+    # re-traverse the hierarchy with a makedirs per member.
+    file_infos = []
+    dirs = set()
+    for info in _open_zip(zip_file).infolist():
+        target = os.path.join(dest, info.filename)
+        if info.is_dir():
+            dirs.add(target)
+        else:
+            dirs.add(os.path.dirname(target))
+            file_infos.append(info)
+    for directory in sorted(dirs, key=len):
+        os.makedirs(directory, exist_ok=True)
+    with _isal_inflate(), \
+            concurrent.futures.ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+        list(executor.map(_extract_one, file_infos))
+
+
+def _copy_test_extension(zip_filename, ext_name, system=None):
+    # Hardlink the pre-extracted template tree into place; this is O(1) per
+    # file compared to inflating the zip again for every test.
+    template = os.path.join(_get_extracted_templates_dir(), zip_filename)
+    shutil.copytree(template, build_extension_path(ext_name, system=system), copy_function=os.link)
+
+
+_TEMPLATES_DIR = None
+
+
+def _get_extracted_templates_dir():
+    # Extract each test extension zip exactly once per run; every test class
+    # copies from these pre-extracted trees so zlib inflation is off the
+    # per-test (and per-class) path entirely.
+    global _TEMPLATES_DIR  # pylint: disable=global-statement
+    if _TEMPLATES_DIR is None:
+        _TEMPLATES_DIR = tempfile.mkdtemp()
+        atexit.register(shutil.rmtree, _TEMPLATES_DIR, ignore_errors=True)
+        for zip_filename in TEST_ZIP_FILES:
+            _extract_zip(_get_test_data_file(zip_filename), os.path.join(_TEMPLATES_DIR, zip_filename))
+    return _TEMPLATES_DIR
+
+
+def setUpModule():
+    # Module-scoped fixture (honored by unittest, pytest and pytest-xdist
+    # alike): one scratch area shared by all classes, reclaimed with a single
+    # rmtree. Each xdist worker is its own process, so the module state and
+    # the lazily extracted templates never conflict across workers.
+    TestExtensionsBase.scratch_dir = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TestExtensionsBase.scratch_dir, ignore_errors=True)
+    TestExtensionsBase.scratch_dir = None
 
 
 class TestExtensionsBase(unittest.TestCase):
 
     def setUp(self):
-        self.ext_dir = tempfile.mkdtemp()
-        self.ext_sys_dir = tempfile.mkdtemp()
-        self.patchers = [mock.patch('azure.cli.core.extension.EXTENSIONS_DIR', self.ext_dir),
-                         mock.patch('azure.cli.core.extension.EXTENSIONS_SYS_DIR', self.ext_sys_dir)]
-        for patcher in self.patchers:
-            patcher.start()
+        # Nest the per-test directories under the module-scoped scratch dir so
+        # the single rmtree in tearDownModule reclaims them, instead of walking
+        # and deleting two trees after every test.
+        self.ext_dir = tempfile.mkdtemp(dir=self.scratch_dir)
+        self.ext_sys_dir = tempfile.mkdtemp(dir=self.scratch_dir)
+        # Plain attribute swaps; mock.patch's reflection and bookkeeping are
+        # overkill for overriding two module globals on every test.
+        self._original_dirs = (azure.cli.core.extension.EXTENSIONS_DIR,
+                               azure.cli.core.extension.EXTENSIONS_SYS_DIR)
+        azure.cli.core.extension.EXTENSIONS_DIR = self.ext_dir
+        azure.cli.core.extension.EXTENSIONS_SYS_DIR = self.ext_sys_dir
 
     def tearDown(self):
-        for patcher in self.patchers:
-            patcher.stop()
-        shutil.rmtree(self.ext_dir, ignore_errors=True)
-        shutil.rmtree(self.ext_sys_dir, ignore_errors=True)
+        (azure.cli.core.extension.EXTENSIONS_DIR,
+         azure.cli.core.extension.EXTENSIONS_SYS_DIR) = self._original_dirs
+        invalidate_extension_cache()
 
 
 class TestExtensions(TestExtensionsBase):
@@ -120,19 +273,19 @@ class TestExtensions(TestExtensionsBase):
         self.assertEqual(actual[0], EXT_NAME)
 
     def test_get_extension_modname_no_mods_with_prefix(self):
-        tmp_dir = tempfile.mkdtemp()
+        tmp_dir = tempfile.mkdtemp(dir=self.scratch_dir)
         with self.assertRaises(AssertionError):
             get_extension_modname(ext_dir=tmp_dir)
 
     def test_get_extension_modname_okay(self):
-        tmp_dir = tempfile.mkdtemp()
+        tmp_dir = tempfile.mkdtemp(dir=self.scratch_dir)
         expected_modname = EXTENSIONS_MOD_PREFIX + 'helloworldmod'
         os.makedirs(os.path.join(tmp_dir, expected_modname))
         actual_modname = get_extension_modname(ext_dir=tmp_dir)
         self.assertEqual(expected_modname, actual_modname)
 
     def test_get_extension_modname_too_many_mods_with_prefix(self):
-        tmp_dir = tempfile.mkdtemp()
+        tmp_dir = tempfile.mkdtemp(dir=self.scratch_dir)
         modname1 = EXTENSIONS_MOD_PREFIX + 'helloworldmod1'
         modname2 = EXTENSIONS_MOD_PREFIX + 'helloworldmod2'
         os.makedirs(os.path.join(tmp_dir, modname1))
@@ -142,82 +295,48 @@ class TestExtensions(TestExtensionsBase):
 
     def test_get_extension_modname_file_with_prefix(self):
         # We should only file a module if it's a directory and not a file even if it has the prefix
-        tmp_dir = tempfile.mkdtemp()
+        tmp_dir = tempfile.mkdtemp(dir=self.scratch_dir)
         filename = EXTENSIONS_MOD_PREFIX + 'helloworld'
         open(os.path.join(tmp_dir, filename), 'a').close()
         with self.assertRaises(AssertionError):
             get_extension_modname(ext_dir=tmp_dir)
 
-    def test_ext_compat_with_cli_no_v_constraint(self):
-        # An extension that does not specify any version constraint on the CLI
-        expected_cli_version = '0.0.1'
-        azext_metadata = None
-        with mock.patch('azure.cli.core.__version__', expected_cli_version):
-            is_compatible, cli_version, _, _ = ext_compat_with_cli(azext_metadata)
-            self.assertTrue(is_compatible)
-            self.assertEqual(cli_version, expected_cli_version)
-
-    def test_ext_compat_with_cli_single_v_constraint(self):
-        # An extension that only works with a specific version of the CLI
-        expected_cli_version = '0.0.1'
-        expected_min_required = '0.0.1'
-        expected_max_required = '0.0.1'
-        azext_metadata = {EXT_METADATA_MINCLICOREVERSION: expected_min_required,
-                          EXT_METADATA_MAXCLICOREVERSION: expected_max_required}
-        with mock.patch('azure.cli.core.__version__', expected_cli_version):
-            is_compatible, cli_version, min_required, max_required = ext_compat_with_cli(azext_metadata)
-            self.assertTrue(is_compatible)
-            self.assertEqual(cli_version, expected_cli_version)
-            self.assertEqual(min_required, expected_min_required)
-            self.assertEqual(max_required, expected_max_required)
-
-    def test_ext_compat_with_cli_only_min_v_constraint(self):
-        expected_cli_version = '0.0.5'
-        expected_min_required = '0.0.1'
-        azext_metadata = {EXT_METADATA_MINCLICOREVERSION: expected_min_required}
-        with mock.patch('azure.cli.core.__version__', expected_cli_version):
-            is_compatible, _, _, _ = ext_compat_with_cli(azext_metadata)
-            self.assertTrue(is_compatible)
-
-    def test_ext_compat_with_cli_failed_bad_min_v_constraint(self):
-        expected_cli_version = '0.0.5'
-        expected_min_required = '0.0.7'
-        azext_metadata = {EXT_METADATA_MINCLICOREVERSION: expected_min_required}
-        with mock.patch('azure.cli.core.__version__', expected_cli_version):
-            is_compatible, _, _, _ = ext_compat_with_cli(azext_metadata)
-            self.assertFalse(is_compatible)
-
-    def test_ext_compat_with_cli_failed_bad_min_but_close_v_constraint(self):
-        expected_cli_version = '0.0.5'
-        expected_min_required = '0.0.5+dev'
-        azext_metadata = {EXT_METADATA_MINCLICOREVERSION: expected_min_required}
-        with mock.patch('azure.cli.core.__version__', expected_cli_version):
-            is_compatible, _, _, _ = ext_compat_with_cli(azext_metadata)
-            self.assertFalse(is_compatible)
-
-    def test_ext_compat_with_cli_only_max_v_constraint(self):
-        expected_cli_version = '0.0.5'
-        expected_max_required = '0.0.10'
-        azext_metadata = {EXT_METADATA_MAXCLICOREVERSION: expected_max_required}
-        with mock.patch('azure.cli.core.__version__', expected_cli_version):
-            is_compatible, _, _, _ = ext_compat_with_cli(azext_metadata)
-            self.assertTrue(is_compatible)
-
-    def test_ext_compat_with_cli_failed_bad_max_v_constraint(self):
-        expected_cli_version = '0.0.5'
-        expected_max_required = '0.0.3'
-        azext_metadata = {EXT_METADATA_MAXCLICOREVERSION: expected_max_required}
-        with mock.patch('azure.cli.core.__version__', expected_cli_version):
-            is_compatible, _, _, _ = ext_compat_with_cli(azext_metadata)
-            self.assertFalse(is_compatible)
-
-    def test_ext_compat_with_cli_failed_bad_max_but_close_v_constraint(self):
-        expected_cli_version = '0.0.5'
-        expected_max_required = '0.0.5b1'
-        azext_metadata = {EXT_METADATA_MAXCLICOREVERSION: expected_max_required}
-        with mock.patch('azure.cli.core.__version__', expected_cli_version):
-            is_compatible, _, _, _ = ext_compat_with_cli(azext_metadata)
-            self.assertFalse(is_compatible)
+    def test_ext_compat_with_cli_matrix(self):
+        # One test with subTests so the eight compatibility cases share a
+        # single setUp/tearDown instead of paying it per case.
+        # (cli_version, min_required, max_required, expect_compatible)
+        cases = [
+            # no version constraint on the CLI
+            ('0.0.1', None, None, True),
+            # only works with a specific version of the CLI
+            ('0.0.1', '0.0.1', '0.0.1', True),
+            # only min constraint
+            ('0.0.5', '0.0.1', None, True),
+            # bad min constraint
+            ('0.0.5', '0.0.7', None, False),
+            # bad min but close constraint
+            ('0.0.5', '0.0.5+dev', None, False),
+            # only max constraint
+            ('0.0.5', None, '0.0.10', True),
+            # bad max constraint
+            ('0.0.5', None, '0.0.3', False),
+            # bad max but close constraint
+            ('0.0.5', None, '0.0.5b1', False),
+        ]
+        for cli_v, min_v, max_v, expect_compatible in cases:
+            with self.subTest(cli=cli_v, min=min_v, max=max_v):
+                azext_metadata = {}
+                if min_v:
+                    azext_metadata[EXT_METADATA_MINCLICOREVERSION] = min_v
+                if max_v:
+                    azext_metadata[EXT_METADATA_MAXCLICOREVERSION] = max_v
+                with _cli_version(cli_v):
+                    is_compatible, cli_version, min_required, max_required = \
+                        ext_compat_with_cli(azext_metadata or None)
+                    self.assertEqual(is_compatible, expect_compatible)
+                    self.assertEqual(cli_version, cli_v)
+                    self.assertEqual(min_required, min_v)
+                    self.assertEqual(max_required, max_v)
 
 
 class TestWheelExtension(TestExtensionsBase):
@@ -251,6 +370,25 @@ class TestWheelExtension(TestExtensionsBase):
         # We check that we can retrieve any one of the az extension metadata values
         self.assertTrue(ext.metadata.get(EXT_METADATA_MINCLICOREVERSION))
 
+    def test_wheel_parsed_cli_version_constraints(self):
+        _install_test_extension2()
+        ext = get_extension(EXT_NAME)
+        # The parsed constraints should round-trip to the declared metadata strings
+        self.assertEqual(str(ext.min_cli_core_version), ext.metadata.get(EXT_METADATA_MINCLICOREVERSION))
+        max_required = ext.metadata.get(EXT_METADATA_MAXCLICOREVERSION)
+        if max_required:
+            self.assertEqual(str(ext.max_cli_core_version), max_required)
+            self.assertLessEqual(ext.min_cli_core_version, ext.max_cli_core_version)
+        else:
+            self.assertIsNone(ext.max_cli_core_version)
+
+    def test_wheel_no_cli_version_constraints(self):
+        # Extension without azext metadata declares no constraints
+        _install_test_extension1()
+        ext = get_extension(EXT_NAME)
+        self.assertIsNone(ext.min_cli_core_version)
+        self.assertIsNone(ext.max_cli_core_version)
+
 
 class TestWheelSystemExtension(TestExtensionsBase):
 